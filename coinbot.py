@@ -1,177 +1,610 @@
+from __future__ import annotations
+
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import time
 import asyncio
+import functools
+import html
+import json
+import pickle
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from decimal import Decimal
+from pathlib import Path
+from types import MappingProxyType
+import httpx
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler, CallbackContext
+from telegram.error import TelegramError
+from telegram.ext import AIORateLimiter, Application, BasePersistence, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler, CallbackContext, PicklePersistence, PersistenceInput
 
 # Import Solana libraries
-from solana.rpc.api import Client
+from solana.rpc.commitment import Confirmed
+from solana.rpc.websocket_api import connect
+from solders.rpc.config import RpcTransactionLogsFilterMentions
+from solders.rpc.responses import LogsNotification
 from solders.pubkey import Pubkey
 from solders.keypair import Keypair
 
-# Enable logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import dumps as json_dumps, loads as json_loads
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed when REDIS_URL is set
+    aioredis = None
+
 logger = logging.getLogger(__name__)
 
+def setup_logging() -> None:
+    """Enable logging; handlers only format and enqueue records, a background thread writes them to stderr"""
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[logging.handlers.QueueHandler(log_queue)]
+    )
+    log_listener.start()
+    atexit.register(log_listener.stop)  # flushes whatever is still queued
+
 # --- NEW Conversation States ---
 SELECTING_SERVICE, SELECTING_PACKAGE, AWAITING_PAYMENT, AWAITING_CONTRACT = range(4)
 
+@dataclass(slots=True)
+class Session:
+    """A user's in-progress order, kept in context.user_data['session']"""
+    service: str = ''
+    contract: str = ''
+    pkg_key: str = ''
+    # When the payment card was shown; only deposits made after it can pay for this order.
+    ordered_at: float = 0.0
+
+def get_session(context: CallbackContext) -> Session:
+    """Returns the user's order state, creating it on first use"""
+    return context.user_data.setdefault('session', Session())
+
 # --- Bot Configuration ---
 BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
-if not BOT_TOKEN: raise ValueError("TELEGRAM_BOT_TOKEN not found.")
+# With PUBLIC_URL set, Telegram pushes updates to a webhook instead of us long-polling getUpdates.
+PUBLIC_URL = os.environ.get('PUBLIC_URL')
+PORT = os.environ.get('PORT', '8443')  # parsed by main() after check_config()
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
 
 SOLANA_RPC_URL = os.environ.get('SOLANA_RPC_URL')
-if not SOLANA_RPC_URL: raise ValueError("SOLANA_RPC_URL not found.")
+# Defaults to the websocket endpoint of the same RPC provider (https -> wss).
+SOLANA_WS_URL = os.environ.get('SOLANA_WS_URL') or (SOLANA_RPC_URL or '').replace('http', 'ws', 1)
 
-TREASURY_PRIVATE_KEY_STR = os.environ.get('TREASURY_WALLET_PRIVATE_KEY')
-if not TREASURY_PRIVATE_KEY_STR: raise ValueError("TREASURY_WALLET_PRIVATE_KEY not found.")
-try:
-    # Use from_base58_string to correctly decode the private key.
-    TREASURY_WALLET = Keypair.from_base58_string(TREASURY_PRIVATE_KEY_STR)
-except Exception as e:
-    raise ValueError(f"Could not decode the private key from Base58. Ensure it's a valid Base58 string. Error: {e}")
+@functools.cache
+def get_treasury() -> Keypair:
+    """Decodes the treasury keypair the first time a code path needs to sign.
+
+    Call it as `await asyncio.to_thread(get_treasury)` from handlers to keep
+    the decoding off the event loop.
+    """
+    try:
+        # Use from_base58_string to correctly decode the private key.
+        return Keypair.from_base58_string(os.environ['TREASURY_WALLET_PRIVATE_KEY'])
+    except Exception as e:
+        raise ValueError(f"Could not decode the private key from Base58. Ensure it's a valid Base58 string. Error: {e}")
 
 DEPOSIT_ADDRESS = '5H5xeKUt1wh5SE8hSJbnh9tsdVgZrUrbGffQjD9HTE9E'
+# Parsed form for the websocket filter; JSON-RPC calls and parsed transactions use the string.
 DEPOSIT_PUBKEY = Pubkey.from_string(DEPOSIT_ADDRESS)
+# Base58 text of 32-44 characters: the shape of any Solana address.
+SOLANA_ADDRESS_RE = re.compile(r'[1-9A-HJ-NP-Za-km-z]{32,44}')
+LAMPORTS_PER_SOL = 1_000_000_000
+PAYMENT_TIMEOUT = 60  # seconds a user waits for their deposit to show up
+PROGRESS_STEPS = 3  # progress bar edits spread over PAYMENT_TIMEOUT, the last one before it
+# Poll on this backoff schedule (52s total) while the deposit websocket is down.
+VERIFY_DELAYS = (2, 3, 5, 8, 13, 21)
+# Older deposits are never accepted, so spent ones only need remembering this long.
+DEPOSIT_MAX_AGE = 24 * 60 * 60
+# Block times are validator clock estimates; allow this much slack against the order time.
+BLOCK_TIME_SKEW = 30
+PERSISTENCE_FILE = 'coinbot_state.pkl'
+CONSUMED_DEPOSITS_FILE = 'coinbot_deposits.json'
+# When set, user data and conversation states live in Redis and survive restarts. Conversation
+# states are only loaded at startup, so run one bot instance per Redis.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+def check_config() -> None:
+    """Fails fast on missing settings; called from main() so importing the module has no side effects"""
+    if not BOT_TOKEN: raise ValueError("TELEGRAM_BOT_TOKEN not found.")
+    if not SOLANA_RPC_URL: raise ValueError("SOLANA_RPC_URL not found.")
+    if not os.environ.get('TREASURY_WALLET_PRIVATE_KEY'): raise ValueError("TREASURY_WALLET_PRIVATE_KEY not found.")
+    if not PORT.isdigit(): raise ValueError(f"PORT must be a port number, got {PORT!r}.")
+    if REDIS_URL and aioredis is None: raise ValueError("REDIS_URL is set but the redis package is not installed (pip install 'redis>=5').")
 
 # --- Enhanced Service & Package Structure ---
-SERVICE_PACKAGES = {
-    'holders': {
-        'name': '📈 Token Holders Increase',
-        'emoji': '📈',
-        'color': '#4CAF50',  # Green
-        'explanation': "This service quickly increases the number of token holders for your project by creating new wallets that acquire a small amount of your token. This helps your project's on-chain data look more active and attractive to new investors.",
-        'packages': {
-            'h_1': {'name': '50 Holders', 'price_sol': 0.5, 'price_lamports': 0.5 * 1e9, 'value': 50, 'emoji': '🔹'},
-            'h_2': {'name': '400 Holders', 'price_sol': 1.8, 'price_lamports': 1.8 * 1e9, 'value': 400, 'emoji': '🔸'},
-            'h_3': {'name': '700 Holders', 'price_sol': 3.0, 'price_lamports': 3.0 * 1e9, 'value': 700, 'emoji': '🔷'},
-            'h_4': {'name': '1000 Holders', 'price_sol': 3.8, 'price_lamports': 3.8 * 1e9, 'value': 1000, 'emoji': '💎'},
-        }
-    },
-    'market_maker': {
-        'name': '📊 Solana Market Maker',
-        'emoji': '📊',
-        'color': '#2196F3',  # Blue
-        'explanation': "Our Market Maker bot engages in automated trading for your token. It executes batch swaps on major DEXs, creating consistent trading volume. This makes your token appear more liquid and can help stabilize its price.",
-        'packages': {
-            'mm_1': {'name': 'Basic Volume', 'price_sol': 0.5, 'price_lamports': 0.5 * 1e9, 'emoji': '🔹'},
-            'mm_2': {'name': 'Standard Volume', 'price_sol': 1.8, 'price_lamports': 1.8 * 1e9, 'emoji': '🔸'},
-            'mm_3': {'name': 'Advanced Volume', 'price_sol': 3.0, 'price_lamports': 3.0 * 1e9, 'emoji': '🔷'},
-            'mm_4': {'name': 'Pro Volume', 'price_sol': 3.8, 'price_lamports': 3.8 * 1e9, 'emoji': '💎'},
-        }
-    },
-    'poster': {
-        'name': '📢 Multi-Group Poster',
-        'emoji': '📢',
-        'color': '#FF9800',  # Orange
-        'explanation': "Gain massive visibility for your project by having your message automatically posted across thousands of relevant crypto Telegram groups. A perfect way to reach a huge audience of potential investors quickly.",
-        'packages': {
-            'p_1': {'name': '50 Groups', 'price_sol': 0.18, 'price_lamports': 0.18 * 1e9, 'emoji': '🔹'},
-            'p_2': {'name': '300 Groups', 'price_sol': 0.5, 'price_lamports': 0.5 * 1e9, 'emoji': '🔸'},
-            'p_3': {'name': '10,000 Groups', 'price_sol': 1.79, 'price_lamports': 1.79 * 1e9, 'emoji': '💎'},
-        }
-    },
-    'trending': {
-        'name': '🚀 DEX Trending (Top 10)',
-        'emoji': '🚀',
-        'color': '#E91E63',  # Pink
-        'explanation': "This is our all-in-one premium package. We activate all our powerful features, including market making, holder increases, and high-frequency trading to push your token into the Top 10 trending list on platforms like DexScreener and DEXTools.",
-        'packages': {
-            't_1': {'name': 'Top 10 Trending', 'price_sol': 3.57, 'price_lamports': 3.57 * 1e9, 'emoji': '💎'},
+@dataclass(frozen=True, slots=True)
+class Package:
+    """A purchasable package of a service"""
+    name: str
+    price_sol: Decimal
+    emoji: str
+    value: int | None = None
+    # Pre-rendered HTML payment message, filled in once the card templates are defined
+    payment_msg: str = field(default='', repr=False)
+    # Exact integer amount derived from price_sol, compared as-is against on-chain balances
+    price_lamports: int = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'price_lamports', int(self.price_sol * LAMPORTS_PER_SOL))
+
+PACKAGES_FILE = Path(__file__).with_name('packages.json')
+
+def load_service_packages(path: Path = PACKAGES_FILE) -> dict:
+    """Reads the service catalog, parsing prices as exact Decimals"""
+    services = json.loads(path.read_text(encoding='utf-8'), parse_float=Decimal)
+    for service_info in services.values():
+        service_info['packages'] = {
+            pkg_key: Package(**pkg_info) for pkg_key, pkg_info in service_info['packages'].items()
         }
-    }
-}
+    return services
+
+SERVICE_PACKAGES = load_service_packages()
 
 # --- On-Chain & Service Logic (Placeholders) ---
 
-async def verify_payment(expected_amount_lamports: int) -> bool:
-    # Implementation remains the same
-    pass
+# Caps in-flight getTransaction calls so bursts stay under the RPC provider's rate limit.
+RPC_SEMAPHORE = asyncio.Semaphore(10)
+
+# Confirmed transactions never change, so remember what each one paid into the
+# destination (None if nothing) and its block time, and only fetch signatures we haven't seen yet.
+# Addresses and signatures are kept as the base58 strings the RPC returns.
+SEEN_SIGS: OrderedDict[tuple[str, str], tuple[int | None, int | None]] = OrderedDict()
+SEEN_SIGS_MAX = 4096
+# Signatures per getSignaturesForAddress page while scanning back to the cursor.
+SIGNATURES_PAGE_SIZE = 100
+# Newest signature already scanned per destination, and the block time back to which every
+# transfer up to it was cached; the next scan only asks for newer ones.
+SIGNATURE_CURSORS: dict[str, tuple[str, float]] = {}
+# Newest block time evicted from SEEN_SIGS per destination; no cursor covers anything before it.
+EVICTED_UNTIL: dict[str, float] = {}
+# In-flight signature scans per destination, with the block time each one looks back to
+# and when (time.monotonic()) it started listing.
+DEPOSIT_SCANS: dict[str, tuple[asyncio.Task, float, float]] = {}
+
+class RpcError(Exception):
+    """A Solana JSON-RPC request failed or returned an error"""
+
+async def rpc_request(http: httpx.AsyncClient, method: str, params: list):
+    """Posts one JSON-RPC request to SOLANA_RPC_URL and returns its result"""
+    payload = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}
+    try:
+        response = await http.post(SOLANA_RPC_URL, content=json_dumps(payload))
+        response.raise_for_status()
+        reply = json_loads(response.content)
+    except (httpx.HTTPError, ValueError) as e:
+        raise RpcError(f"{method}: {e}") from e
+    if 'error' in reply:
+        raise RpcError(f"{method}: {reply['error']}")
+    return reply['result']
+
+def remember_delta(dest: str, signature: str, delta: int | None, block_time: int | None) -> None:
+    """Caches a transaction's deposit amount, evicting the least recently seen entry"""
+    SEEN_SIGS[dest, signature] = delta, block_time
+    SEEN_SIGS.move_to_end((dest, signature))
+    if len(SEEN_SIGS) > SEEN_SIGS_MAX:
+        (evicted_dest, _), (_, evicted_time) = SEEN_SIGS.popitem(last=False)
+        if evicted_time is None:
+            evicted_time = time.time()
+        EVICTED_UNTIL[evicted_dest] = max(EVICTED_UNTIL.get(evicted_dest, 0.0), evicted_time)
+
+class DepositLedger:
+    """Deposits already used by a verified payment, saved to a JSON file so they stay spent across restarts"""
+
+    def __init__(self, path: str = CONSUMED_DEPOSITS_FILE):
+        self.path = Path(path)
+        try:
+            self.consumed: dict[str, int] = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            self.consumed = {}
+        self.lock = asyncio.Lock()
+
+    async def claim(self, signature: str, block_time: int) -> bool:
+        """Records a deposit as spent, returning False if it already was"""
+        async with self.lock:
+            if signature in self.consumed:
+                return False
+            # Deposits past DEPOSIT_MAX_AGE are rejected anyway, so their entries can go.
+            cutoff = time.time() - DEPOSIT_MAX_AGE
+            self.consumed = {sig: spent_at for sig, spent_at in self.consumed.items() if spent_at >= cutoff}
+            self.consumed[signature] = block_time
+            await asyncio.to_thread(self._save, json.dumps(self.consumed))
+            return True
+
+    def _save(self, text: str) -> None:
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, self.path)  # never leave a half-written ledger behind
+
+    async def close(self) -> None:
+        pass
 
-async def execute_service(service_type: str, package: dict, contract: str):
+class RedisDepositLedger:
+    """DepositLedger kept in Redis next to the bot's other state"""
+
+    def __init__(self, url: str):
+        self.redis = aioredis.from_url(url)
+
+    async def claim(self, signature: str, block_time: int) -> bool:
+        # SET NX is atomic, so two payments can never claim the same deposit.
+        return bool(await self.redis.set(f'deposit:{signature}', block_time, nx=True, ex=DEPOSIT_MAX_AGE))
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+async def claim_deposit(ledger: DepositLedger | RedisDepositLedger, signature: str, delta: int | None,
+                        block_time: int | None, expected_amount_lamports: int, not_before: float) -> bool:
+    """Marks a matching deposit made after not_before as consumed unless another payment already claimed it"""
+    if delta != expected_amount_lamports or block_time is None:
+        return False
+    if block_time < max(not_before, time.time() - DEPOSIT_MAX_AGE):
+        return False  # sent before this order was placed, so it belongs to an earlier one
+    # Shielded: a claim can't be taken back once it is saved, so the payment timeout must not cut it short.
+    claim = asyncio.ensure_future(ledger.claim(signature, block_time))
+    try:
+        claimed = await asyncio.shield(claim)
+    except asyncio.CancelledError:
+        # Timed out mid-claim. If the deposit ended up spent, it paid for this order after all.
+        if not await asyncio.shield(claim):
+            raise
+        asyncio.current_task().uncancel()
+        claimed = True
+    if not claimed:
+        return False
+    logger.info("Payment verified! Signature: %s", signature)
+    return True
+
+async def claim_seen_deposit(ledger: DepositLedger | RedisDepositLedger, dest: str,
+                             expected_amount_lamports: int, not_before: float) -> bool:
+    """Claims a matching deposit among the transactions already fetched for dest"""
+    # Collect first: SEEN_SIGS may change while a claim is being saved.
+    candidates = [
+        (signature, delta, block_time)
+        for (seen_dest, signature), (delta, block_time) in reversed(SEEN_SIGS.items())
+        if seen_dest == dest and delta == expected_amount_lamports
+    ]
+    for candidate in candidates:
+        if await claim_deposit(ledger, *candidate, expected_amount_lamports, not_before):
+            return True
+    return False
+
+async def fetch_transaction(http: httpx.AsyncClient, signature: str):
+    """Fetches one transaction, returning None if the RPC call fails"""
+    params = [signature, {'encoding': 'jsonParsed', 'commitment': 'confirmed', 'maxSupportedTransactionVersion': 0}]
+    async with RPC_SEMAPHORE:
+        try:
+            return signature, await rpc_request(http, 'getTransaction', params)
+        except RpcError as e:
+            logger.warning("Could not fetch transaction %s: %s", signature, e)
+            return signature, None
+
+def deposit_delta(tx: dict | None, dest: str) -> int | None:
+    """Returns how many lamports a fetched transaction moved into dest"""
+    if tx is None or tx.get('meta') is None:
+        return None
+    # jsonParsed lists every account, including v0 lookup-table ones, in balance order.
+    for idx, account in enumerate(tx['transaction']['message']['accountKeys']):
+        if account['pubkey'] == dest:
+            meta = tx['meta']
+            return meta['postBalances'][idx] - meta['preBalances'][idx]
+    return None
+
+async def scan_deposits(http: httpx.AsyncClient, dest: str, since: float) -> None:
+    """Caches the deposit deltas of transfers to dest made after since"""
+    config = {'limit': SIGNATURES_PAGE_SIZE, 'commitment': 'confirmed'}
+    cursor = SIGNATURE_CURSORS.get(dest)
+    # The cursor only helps while the cache still holds everything back to since.
+    incremental = cursor is not None and max(cursor[1], EVICTED_UNTIL.get(dest, 0.0)) <= since
+    if incremental:
+        config['until'] = cursor[0]
+    # Nothing older can be claimed, so there is no need to fetch it.
+    floor = time.time() - DEPOSIT_MAX_AGE if incremental else since
+    signatures = []
+    try:
+        # Listings are newest first; page back until the cursor (a short page), since,
+        # or as many signatures as the cache can hold.
+        while True:
+            page = await rpc_request(http, 'getSignaturesForAddress', [dest, config])
+            signatures += page
+            oldest_time = page[-1]['blockTime'] if page else None
+            if len(page) < SIGNATURES_PAGE_SIZE:
+                covered_since = max(cursor[1], floor) if incremental else since
+                break
+            if not incremental and oldest_time is not None and oldest_time < since:
+                covered_since = since
+                break
+            if len(signatures) >= SEEN_SIGS_MAX:
+                del signatures[SEEN_SIGS_MAX:]
+                oldest_time = signatures[-1]['blockTime']
+                covered_since = oldest_time if oldest_time is not None else time.time()
+                break
+            config['before'] = page[-1]['signature']
+    except RpcError as e:
+        logger.warning("Payment check failed: %s", e)
+        return
+
+    unseen = [
+        sig_info['signature'] for sig_info in signatures
+        if sig_info['err'] is None
+        and (sig_info['blockTime'] is None or sig_info['blockTime'] >= floor)
+        and (dest, sig_info['signature']) not in SEEN_SIGS
+    ]
+    complete = True
+    results = await asyncio.gather(*(fetch_transaction(http, signature) for signature in unseen))
+    # Cache oldest first, so if the cache overflows it evicts old transfers, not the ones users are waiting on.
+    for signature, tx in reversed(results):
+        if tx is None:
+            complete = False  # not available yet or the fetch failed; retry on the next scan
+            continue
+        remember_delta(dest, signature, deposit_delta(tx, dest), tx.get('blockTime'))
+
+    # Only move the cursor once every new signature is cached, or a missed one would never be re-listed,
+    # and never claim coverage back past an evicted entry.
+    if complete and signatures:
+        SIGNATURE_CURSORS[dest] = signatures[0]['signature'], max(covered_since, EVICTED_UNTIL.get(dest, 0.0))
+
+async def verify_payment(http: httpx.AsyncClient, ledger: DepositLedger | RedisDepositLedger,
+                         expected_amount_lamports: int, not_before: float, dest: str = DEPOSIT_ADDRESS,
+                         started_after: float = 0.0) -> bool:
+    """Looks for a transfer of exactly the expected amount to dest made after not_before.
+
+    started_after (a time.monotonic() value) asks for a scan that began listing no earlier,
+    e.g. one that can see deposits made while the websocket was down.
+    """
+    since = max(not_before, time.time() - DEPOSIT_MAX_AGE)
+    # Concurrent checks share one in-flight scan instead of each listing the same signatures,
+    # as long as it looks back far enough for this order and is recent enough.
+    running = DEPOSIT_SCANS.get(dest)
+    if running is not None and running[1] <= since and running[2] >= started_after:
+        scan = running[0]
+    else:
+        scan = asyncio.create_task(scan_deposits(http, dest, since))
+        DEPOSIT_SCANS[dest] = scan, since, time.monotonic()
+
+        def forget(task: asyncio.Task) -> None:
+            if DEPOSIT_SCANS.get(dest, (None,))[0] is task:  # a newer scan may have replaced it
+                del DEPOSIT_SCANS[dest]
+        scan.add_done_callback(forget)
+    # Shielded so a waiter timing out doesn't cancel the scan for everyone else.
+    await asyncio.shield(scan)
+    return await claim_seen_deposit(ledger, dest, expected_amount_lamports, not_before)
+
+async def execute_service(service_type: str, package: Package, contract: str):
+    # One lazily formatted line per order instead of a multi-line banner.
+    logger.info("Executing service=%s package=%s contract=%s lamports=%d",
+                service_type, package.name, contract, package.price_lamports)
     # Implementation remains the same
     pass
 
+def notify_waiters(waiters: set, deposit: tuple[str, int | None, int | None] | None) -> None:
+    """Hands a fetched deposit to every waiting payment check; None asks them to re-scan via RPC"""
+    for deposits in waiters:
+        deposits.put_nowait(deposit)
+
+async def watch_deposits(application: Application) -> None:
+    """Fetches each transaction that touches the deposit address as soon as it is confirmed"""
+    client = application.bot_data['solana']
+    waiters = application.bot_data['deposit_waiters']
+    websocket_up = application.bot_data['deposit_ws_up']
+    while True:
+        try:
+            async with connect(SOLANA_WS_URL) as websocket:
+                await websocket.logs_subscribe(RpcTransactionLogsFilterMentions(DEPOSIT_PUBKEY), commitment=Confirmed)
+                await websocket.recv()  # subscription confirmation
+                websocket_up.set()
+                # Anything that landed while we were disconnected needs a full scan.
+                notify_waiters(waiters, None)
+                async for messages in websocket:
+                    for message in messages:
+                        if not isinstance(message, LogsNotification) or message.result.value.err is not None:
+                            continue
+                        signature = str(message.result.value.signature)
+                        if (DEPOSIT_ADDRESS, signature) in SEEN_SIGS:
+                            # Already fetched by a payment scan.
+                            notify_waiters(waiters, (signature, *SEEN_SIGS[DEPOSIT_ADDRESS, signature]))
+                            continue
+                        signature, tx = await fetch_transaction(client, signature)
+                        if tx is None:
+                            notify_waiters(waiters, None)
+                            continue
+                        delta = deposit_delta(tx, DEPOSIT_ADDRESS)
+                        remember_delta(DEPOSIT_ADDRESS, signature, delta, tx.get('blockTime'))
+                        notify_waiters(waiters, (signature, delta, tx.get('blockTime')))
+        except Exception:
+            logger.exception("Deposit websocket failed, reconnecting")
+        websocket_up.clear()
+        notify_waiters(waiters, None)  # switch waiting checks over to polling
+        await asyncio.sleep(5)
+
+async def wait_for_payment(context: CallbackContext, expected_amount_lamports: int, not_before: float) -> None:
+    """Returns once the deposit is found, from websocket deposits or by polling RPC while the websocket is down"""
+    client = context.bot_data['solana']
+    ledger = context.bot_data['deposit_ledger']
+    websocket_up = context.bot_data['deposit_ws_up']
+    deposits = asyncio.Queue()
+    waiters = context.bot_data['deposit_waiters']
+    waiters.add(deposits)
+    delays = iter(VERIFY_DELAYS)
+    # The payment may have landed before the user tapped Verify; scan while listening for deposits.
+    scan = asyncio.create_task(verify_payment(client, ledger, expected_amount_lamports, not_before))
+    rescan_after = None  # set when a reconnect needs a scan newer than the running one
+    get = None
+    try:
+        while True:
+            if get is None:
+                get = asyncio.create_task(deposits.get())
+            timeout = None if scan or websocket_up.is_set() else next(delays, None)
+            done, _ = await asyncio.wait(
+                [task for task in (scan, get) if task],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                scan = asyncio.create_task(verify_payment(client, ledger, expected_amount_lamports, not_before))
+                continue
+            if scan in done:
+                if scan.result():
+                    return
+                scan = None
+                if rescan_after is not None:
+                    scan = asyncio.create_task(verify_payment(
+                        client, ledger, expected_amount_lamports, not_before, started_after=rescan_after
+                    ))
+                rescan_after = None
+            if get in done:
+                deposit = get.result()
+                get = None
+                if deposit is None:
+                    # Scans that started listing before now can miss what landed during the gap.
+                    if scan:
+                        rescan_after = time.monotonic()
+                    else:
+                        scan = asyncio.create_task(verify_payment(
+                            client, ledger, expected_amount_lamports, not_before, started_after=time.monotonic()
+                        ))
+                elif await claim_deposit(ledger, *deposit, expected_amount_lamports, not_before):
+                    return
+    finally:
+        for task in (scan, get):
+            if task:
+                task.cancel()
+        waiters.discard(deposits)
+
 # --- UI Improvements ---
 
 def generate_service_menu():
     """Generate visually appealing service menu"""
-    keyboard = []
-    for service_key, service_info in SERVICE_PACKAGES.items():
-        button = InlineKeyboardButton(
+    keyboard = [
+        (InlineKeyboardButton(
             text=f"{service_info['emoji']} {service_info['name']}",
             callback_data=f'service_{service_key}'
-        )
-        keyboard.append([button])
+        ),)
+        for service_key, service_info in SERVICE_PACKAGES.items()
+    ]
     return InlineKeyboardMarkup(keyboard)
 
 def generate_package_menu(service_key):
     """Generate visually appealing package menu"""
     service_info = SERVICE_PACKAGES[service_key]
-    keyboard = []
-    
+
     # Package cards with emojis and prices
-    for pkg_key, pkg_info in service_info['packages'].items():
-        button_text = f"{pkg_info['emoji']} {pkg_info['name']} - {pkg_info['price_sol']} SOL"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"pkg_{pkg_key}")])
+    keyboard = [
+        (InlineKeyboardButton(
+            f"{pkg_info.emoji} {pkg_info.name} - {pkg_info.price_sol} SOL",
+            callback_data=f"pkg_{pkg_key}"
+        ),)
+        for pkg_key, pkg_info in service_info['packages'].items()
+    ]
     
     # Back button
-    keyboard.append([InlineKeyboardButton("🔙 Back to Services", callback_data="back_to_services")])
+    keyboard.append((InlineKeyboardButton("🔙 Back to Services", callback_data="back_to_services"),))
     
     return InlineKeyboardMarkup(keyboard)
 
+# Keyboards never change at runtime, so build them once and reuse them.
+SERVICE_MENU = generate_service_menu()
+PACKAGE_MENUS = {service_key: generate_package_menu(service_key) for service_key in SERVICE_PACKAGES}
+VERIFY_PAYMENT_MENU = InlineKeyboardMarkup([[InlineKeyboardButton("✅ Verify Payment", callback_data="confirm_payment")]])
+
+_SERVICE_CARD_TMPL = (
+    "✨ *{name}* ✨\n\n"
+    "{explanation}\n\n"
+    "👇 *Please reply with your token's contract address below:*"
+)
+
+# The payment message is HTML: <code> makes the deposit address tap-to-copy.
+_PACKAGE_CARD_TMPL = (
+    "📦 <b>Selected Package</b>: {emoji} {name}\n\n"
+    "💳 <b>Price</b>: <code>{price_sol} SOL</code>\n\n"
+    "👇 <b>Send payment to the address below:</b>"
+)
+
+_PAYMENT_CARD_TMPL = (
+    "💸 <b>Payment Required</b>: <code>{price_sol} SOL</code>\n\n"
+    f"🏦 <b>Deposit Address</b>:\n<code>{DEPOSIT_ADDRESS}</code>\n\n"
+    "🔍 <b>After payment, click the button below to verify</b>\n"
+    "⏱️ <b>Note: Transactions usually take &lt;30 seconds to detect</b>"
+)
+
 def format_service_card(service_info):
     """Format service information as a visual card"""
-    return (
-        f"✨ *{service_info['name']}* ✨\n\n"
-        f"{service_info['explanation']}\n\n"
-        "👇 *Please reply with your token's contract address below:*"
-    )
+    return _SERVICE_CARD_TMPL.format(name=service_info['name'], explanation=service_info['explanation'])
 
 def format_package_card(package_info):
     """Format package information as a visual card"""
-    return (
-        f"📦 *Selected Package*: {package_info['emoji']} {package_info['name']}\n\n"
-        f"💳 *Price*: `{package_info['price_sol']} SOL`\n\n"
-        "👇 *Send payment to the address below:*"
+    return _PACKAGE_CARD_TMPL.format(
+        emoji=package_info.emoji, name=html.escape(package_info.name), price_sol=package_info.price_sol
     )
 
 def format_payment_card(package_info):
     """Format payment information as a visual card"""
-    return (
-        f"💸 *Payment Required*: `{package_info['price_sol']} SOL`\n\n"
-        f"🏦 *Deposit Address*:\n`{DEPOSIT_ADDRESS}`\n\n"
-        "🔍 *After payment, click the button below to verify*\n"
-        "⏱️ *Note: Transactions usually take <30 seconds to detect*"
-    )
+    return _PAYMENT_CARD_TMPL.format(price_sol=package_info.price_sol)
+
+# Every card only depends on static package data, so render them all up front.
+for _service in SERVICE_PACKAGES.values():
+    _service['_card'] = format_service_card(_service)
+    _service['packages'] = {
+        pkg_key: replace(
+            pkg_info, payment_msg=f"{format_package_card(pkg_info)}\n\n{format_payment_card(pkg_info)}"
+        )
+        for pkg_key, pkg_info in _service['packages'].items()
+    }
+# Rendering is done; the catalog is read-only from here on.
+SERVICE_PACKAGES = MappingProxyType(SERVICE_PACKAGES)
+
+# Flat index so a package callback resolves with a single lookup.
+PACKAGES_BY_KEY = {
+    pkg_key: (service_key, pkg_info)
+    for service_key, service_info in SERVICE_PACKAGES.items()
+    for pkg_key, pkg_info in service_info['packages'].items()
+}
+
+# Every callback_data value the menus can produce, for O(1) handler matching.
+SERVICE_CALLBACKS = frozenset(f'service_{service_key}' for service_key in SERVICE_PACKAGES)
+PACKAGE_CALLBACKS = frozenset(f'pkg_{pkg_key}' for pkg_key in PACKAGES_BY_KEY)
 
 # --- Main Bot Conversation Handlers ---
 
+WELCOME_MSG = (
+    "🌟 *Welcome to CoinBoost Bot!* 🌟\n\n"
+    "Accelerate your token's growth with our premium services:\n"
+    "▫️ Increase holders\n▫️ Boost trading volume\n"
+    "▫️ Telegram promotions\n▫️ Trending campaigns\n\n"
+    "👇 *Select a service to begin:*"
+)
+
 async def start(update: Update, context: CallbackContext) -> int:
     """Displays the main menu of services with enhanced UI"""
-    welcome_msg = (
-        "🌟 *Welcome to CoinBoost Bot!* 🌟\n\n"
-        "Accelerate your token's growth with our premium services:\n"
-        "▫️ Increase holders\n▫️ Boost trading volume\n"
-        "▫️ Telegram promotions\n▫️ Trending campaigns\n\n"
-        "👇 *Select a service to begin:*"
+    await update.message.reply_text(
+        WELCOME_MSG,
+        reply_markup=SERVICE_MENU,
+        parse_mode='Markdown'
+    )
+    return SELECTING_SERVICE
+
+async def back_to_services(update: Update, context: CallbackContext) -> int:
+    """Turns the package menu back into the main menu"""
+    await update.callback_query.answer()
+    await update.callback_query.edit_message_text(
+        WELCOME_MSG,
+        reply_markup=SERVICE_MENU,
+        parse_mode='Markdown'
     )
-    
-    if update.callback_query:
-        await update.callback_query.edit_message_text(
-            welcome_msg,
-            reply_markup=generate_service_menu(),
-            parse_mode='Markdown'
-        )
-    else:
-        await update.message.reply_text(
-            welcome_msg,
-            reply_markup=generate_service_menu(),
-            parse_mode='Markdown'
-        )
     return SELECTING_SERVICE
 
 async def select_service(update: Update, context: CallbackContext) -> int:
@@ -179,12 +612,12 @@ async def select_service(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     await query.answer()
     
-    service_key = query.data.split('_')[1]
-    context.user_data['service'] = service_key
+    service_key = query.data.removeprefix('service_')
+    get_session(context).service = service_key
     service_info = SERVICE_PACKAGES[service_key]
 
     await query.edit_message_text(
-        text=format_service_card(service_info),
+        text=service_info['_card'],
         reply_markup=None,
         parse_mode='Markdown'
     )
@@ -192,15 +625,28 @@ async def select_service(update: Update, context: CallbackContext) -> int:
 
 async def received_contract(update: Update, context: CallbackContext) -> int:
     """Shows package selection with enhanced UI"""
-    context.user_data['contract'] = update.message.text
-    service_key = context.user_data['service']
+    session = get_session(context)
+    if not session.service:
+        # The user data expired while the conversation was still waiting for an address.
+        await update.message.reply_text("❌ Session expired. Please /start again.")
+        return ConversationHandler.END
+
+    contract = update.message.text.strip()
+    if not SOLANA_ADDRESS_RE.fullmatch(contract):
+        await update.message.reply_text(
+            "❌ That doesn't look like a Solana contract address. Please send it again:"
+        )
+        return AWAITING_CONTRACT
+
+    session.contract = contract
+    service_key = session.service
     service_info = SERVICE_PACKAGES[service_key]
     
     await update.message.reply_text(
         f"✅ *Contract Received!* ✅\n\n"
-        f"Token Contract: `{update.message.text[:12]}...`\n\n"
+        f"Token Contract: `{contract[:12]}...`\n\n"
         f"👇 *Select a package for {service_info['name']}:*",
-        reply_markup=generate_package_menu(service_key),
+        reply_markup=PACKAGE_MENUS[service_key],
         parse_mode='Markdown'
     )
     return SELECTING_PACKAGE
@@ -210,32 +656,45 @@ async def select_package(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     await query.answer()
 
-    pkg_key = query.data.split('_', 1)[1]
-    service_key = context.user_data['service']
-    package_info = SERVICE_PACKAGES[service_key]['packages'][pkg_key]
-    context.user_data['package'] = package_info
+    pkg_key = query.data.removeprefix('pkg_')
+    service_key, package_info = PACKAGES_BY_KEY[pkg_key]
+    session = get_session(context)
+    session.service = service_key
+    # Picking the same package again keeps the order time, so a deposit sent in between still counts.
+    if session.pkg_key != pkg_key or time.time() - session.ordered_at > DEPOSIT_MAX_AGE:
+        session.ordered_at = time.time()
+    session.pkg_key = pkg_key
 
-    # Create payment card
-    payment_msg = (
-        f"{format_package_card(package_info)}\n\n"
-        f"{format_payment_card(package_info)}"
-    )
-    
-    keyboard = [[InlineKeyboardButton("✅ Verify Payment", callback_data="confirm_payment")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await query.edit_message_text(
-        text=payment_msg,
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
+        text=package_info.payment_msg,
+        reply_markup=VERIFY_PAYMENT_MENU,
+        parse_mode='HTML'
     )
     return AWAITING_PAYMENT
 
+async def show_progress(query, processing_msg: str) -> None:
+    """Fills the progress bar while the payment is being verified"""
+    # Few, evenly spaced steps: every edit counts against the bot's outgoing rate limit.
+    # One extra interval keeps the last step clear of the timeout and its "not found" edit.
+    for i in range(1, PROGRESS_STEPS + 1):
+        await asyncio.sleep(PAYMENT_TIMEOUT / (PROGRESS_STEPS + 1))
+        progress = "🟢" * i + "⚪️" * (PROGRESS_STEPS - i)
+        try:
+            await query.edit_message_text(
+                text=f"{processing_msg}\n\nProgress: {progress}",
+                parse_mode='Markdown'
+            )
+        except TelegramError as e:
+            # A missed progress step is cosmetic; keep ticking.
+            logger.debug("Progress update failed: %s", e)
+
 async def process_payment(update: Update, context: CallbackContext) -> int:
     """Payment processing with enhanced UI"""
     query = update.callback_query
-    await query.answer()
-    
+    # Taps that arrive before the Verify button is edited away go to already_verifying;
+    # caching this answer lets clients skip sending the quickest of them at all.
+    await query.answer(cache_time=5)
+
     # Show processing animation
     processing_msg = (
         "🔍 *Verifying Payment...*\n\n"
@@ -247,26 +706,26 @@ async def process_payment(update: Update, context: CallbackContext) -> int:
         text=processing_msg,
         parse_mode='Markdown'
     )
-    
-    package = context.user_data.get('package')
-    if not package:
+
+    session = context.user_data.get('session')
+    if session is None or not session.pkg_key or not session.ordered_at:
         await query.message.reply_text("❌ Session expired. Please /start again.")
         return ConversationHandler.END
 
-    expected_amount = package['price_lamports']
-    payment_found = False
-    for i in range(1, 7):  # 6 checks, 10 seconds apart
-        if await verify_payment(int(expected_amount)):
-            payment_found = True
-            break
-            
-        # Update progress
-        progress = "🟢" * i + "⚪️" * (6 - i)
-        await query.edit_message_text(
-            text=f"{processing_msg}\n\nProgress: {progress}",
-            parse_mode='Markdown'
+    _, package = PACKAGES_BY_KEY[session.pkg_key]
+    expected_amount = package.price_lamports
+    progress_task = asyncio.create_task(show_progress(query, processing_msg))
+    try:
+        await asyncio.wait_for(
+            wait_for_payment(context, expected_amount, session.ordered_at - BLOCK_TIME_SKEW),
+            timeout=PAYMENT_TIMEOUT,
         )
-        await asyncio.sleep(10)
+        payment_found = True
+        session.ordered_at = 0.0  # paid; the next order starts its own deposit window
+    except asyncio.TimeoutError:
+        payment_found = False
+    finally:
+        progress_task.cancel()
 
     if payment_found:
         success_msg = (
@@ -278,11 +737,9 @@ async def process_payment(update: Update, context: CallbackContext) -> int:
             text=success_msg,
             parse_mode='Markdown'
         )
-        
-        service_type = context.user_data.get('service')
-        contract = context.user_data.get('contract')
-        success = await execute_service(service_type, package, contract)
-        
+
+        success = await execute_service(session.service, package, session.contract)
+
         if success:
             completion_msg = (
                 "✨ *Service Completed!* ✨\n\n"
@@ -310,14 +767,22 @@ async def process_payment(update: Update, context: CallbackContext) -> int:
             "▫️ Insufficient SOL amount sent\n"
             "▫️ Transaction not confirmed yet\n"
             "▫️ Wrong deposit address used\n\n"
-            "Please double-check and try again, or /start over."
+            "Please double-check and tap Verify again, or /start over."
         )
+        # The order stays open: a deposit that lands later can still be verified.
         await query.edit_message_text(
             text=error_msg,
+            reply_markup=VERIFY_PAYMENT_MENU,
             parse_mode='Markdown'
         )
+        return AWAITING_PAYMENT
     return ConversationHandler.END
 
+async def already_verifying(update: Update, context: CallbackContext) -> None:
+    """Answers Verify taps while that user's payment check is still running"""
+    # Let clients reuse this toast for further rapid taps instead of sending us each one.
+    await update.callback_query.answer("⏳ Already verifying your payment...", cache_time=5)
+
 async def cancel(update: Update, context: CallbackContext) -> int:
     """Enhanced cancellation message"""
     cancel_msg = (
@@ -337,25 +802,158 @@ async def cancel(update: Update, context: CallbackContext) -> int:
         )
     return ConversationHandler.END
 
+# --- Persistence ---
+
+class RedisPersistence(BasePersistence):
+    """Stores user_data and conversation states in Redis so orders survive a restart"""
+
+    def __init__(self, url: str, ttl: int = 24 * 60 * 60):
+        # bot_data only holds per-process clients and tasks; chat_data and callback data are unused.
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=1,
+        )
+        self.redis = aioredis.from_url(url)
+        self.ttl = ttl  # idle orders expire instead of piling up
+
+    async def get_user_data(self) -> dict:
+        user_data = {}
+        async for key in self.redis.scan_iter(match='ud:*'):
+            value = await self.redis.get(key)
+            if value is not None:  # may have expired since the scan
+                user_data[int(key.split(b':', 1)[1])] = pickle.loads(value)
+        return user_data
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self.redis.set(f'ud:{user_id}', pickle.dumps(data), ex=self.ttl)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # With a single instance the in-memory copy is the newest one; reloading it from Redis
+        # would undo changes the next update_user_data hasn't written yet.
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self.redis.delete(f'ud:{user_id}')
+
+    async def get_conversations(self, name: str) -> dict:
+        prefix = f'conv:{name}:'.encode()
+        conversations = {}
+        async for key in self.redis.scan_iter(match=prefix + b'*'):
+            state = await self.redis.get(key)
+            if state is not None:  # may have expired since the scan
+                conversations[tuple(int(part) for part in key[len(prefix):].split(b':'))] = pickle.loads(state)
+        return conversations
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        # One key per conversation, expiring like the user_data it depends on.
+        conv_key = f"conv:{name}:{':'.join(map(str, key))}"
+        if new_state is None:
+            await self.redis.delete(conv_key)
+        else:
+            await self.redis.set(conv_key, pickle.dumps(new_state), ex=self.ttl)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self.redis.aclose()
+
+async def post_init(application: Application) -> None:
+    """Opens the shared Solana RPC client and deposit websocket listener"""
+    application.bot_data['solana'] = httpx.AsyncClient(http2=True, headers={'Content-Type': 'application/json'})
+    application.bot_data['deposit_ledger'] = RedisDepositLedger(REDIS_URL) if REDIS_URL else DepositLedger()
+    application.bot_data['deposit_waiters'] = set()
+    application.bot_data['deposit_ws_up'] = asyncio.Event()
+    application.bot_data['deposit_watcher'] = asyncio.create_task(watch_deposits(application))
+
+async def post_shutdown(application: Application) -> None:
+    """Stops the deposit websocket listener and closes the RPC client"""
+    application.bot_data['deposit_watcher'].cancel()
+    await application.bot_data['solana'].aclose()
+    await application.bot_data['deposit_ledger'].close()
+
 def main() -> None:
-    application = Application.builder().token(BOT_TOKEN).build()
+    setup_logging()
+    check_config()
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    if REDIS_URL:
+        persistence = RedisPersistence(REDIS_URL)
+    else:
+        # bot_data only holds the RPC client and websocket task, which are rebuilt on startup.
+        persistence = PicklePersistence(filepath=PERSISTENCE_FILE, store_data=PersistenceInput(bot_data=False))
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        # Multiplex concurrent bot API calls over one HTTP/2 connection instead of one socket each,
+        # and wait a little for a free stream rather than failing with a pool timeout under bursts.
+        # getUpdates is a single long poll with nothing to multiplex, so it stays on HTTP/1.1.
+        .http_version('2')
+        .pool_timeout(10)
+        .persistence(persistence)
+        # Queues outgoing calls under Telegram's ~30 msg/s limit and waits out retry_after on a 429.
+        .rate_limiter(AIORateLimiter(max_retries=2))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start)],
         states={
-            SELECTING_SERVICE: [CallbackQueryHandler(select_service, pattern=r'^service_.*$')],
+            SELECTING_SERVICE: [CallbackQueryHandler(select_service, pattern=SERVICE_CALLBACKS.__contains__)],
             AWAITING_CONTRACT: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_contract)],
             SELECTING_PACKAGE: [
-                CallbackQueryHandler(select_package, pattern=r'^pkg_.*$'),
-                CallbackQueryHandler(start, pattern=r'^back_to_services$')
+                CallbackQueryHandler(select_package, pattern=PACKAGE_CALLBACKS.__contains__),
+                CallbackQueryHandler(back_to_services, pattern=lambda data: data == 'back_to_services')
             ],
-            AWAITING_PAYMENT: [CallbackQueryHandler(process_payment, pattern=r'^confirm_payment$')],
+            # Verification can take up to PAYMENT_TIMEOUT, so don't hold up other users' updates.
+            AWAITING_PAYMENT: [CallbackQueryHandler(process_payment, pattern=lambda data: data == 'confirm_payment', block=False)],
+            # While process_payment is pending, updates for that conversation only go to these handlers.
+            ConversationHandler.WAITING: [CallbackQueryHandler(already_verifying, pattern=lambda data: data == 'confirm_payment')],
         },
         fallbacks=[CommandHandler('cancel', cancel), CallbackQueryHandler(cancel)],
+        name='main',
+        persistent=True,
     )
     application.add_handler(conv_handler)
-    print("🚀 CoinBoost Bot is running...")
-    application.run_polling()
+    logger.info("🚀 CoinBoost Bot is running...")
+    allowed_updates = [Update.MESSAGE, Update.CALLBACK_QUERY]
+    if PUBLIC_URL:
+        application.run_webhook(
+            listen='0.0.0.0',
+            port=int(PORT),
+            url_path=BOT_TOKEN,
+            webhook_url=f"{PUBLIC_URL.rstrip('/')}/{BOT_TOKEN}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+        )
+    else:
+        application.run_polling(allowed_updates=allowed_updates)
 
 if __name__ == '__main__':
     main()